@@ -9,6 +9,7 @@ from pytorch_lightning.callbacks import (
     ModelCheckpoint,
 )
 from pytorch_lightning.loggers import WandbLogger
+from pytorch_lightning.utilities.device_parser import parse_gpu_ids
 from pytorch_ssd.args import str2bool
 from pytorch_ssd.modeling.model import SSD
 
@@ -58,6 +59,13 @@ def main(hparams):
     )
     logger.watch(model, log=hparams.watch, log_freq=hparams.watch_freq)
 
+    if (
+        hparams.accelerator is None
+        and hparams.distributed_backend is None
+        and len(parse_gpu_ids(hparams.gpus) or []) > 1
+    ):
+        # one process per GPU scales much better than DataParallel
+        hparams.accelerator = "ddp"
     trainer = Trainer.from_argparse_args(hparams, logger=logger, callbacks=callbacks)
     trainer.tune(model)
     trainer.fit(model)
@@ -111,6 +119,9 @@ def cli():
         help="How often to perform model watch.",
     )
     parser = Trainer.add_argparse_args(parser)
+    # input image and feature maps shapes are constant, so let cudnn choose
+    # the fastest algorithms
+    parser.set_defaults(benchmark=True)
     args = parser.parse_args()
 
     main(args)
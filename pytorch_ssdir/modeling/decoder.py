@@ -34,6 +34,14 @@ class Decoder(nn.Module):
         self.where_stn = WhereTransformer(image_size=ssd.image_size[0])
         self.drop = drop_empty
         self.background = background
+        self.register_buffer(
+            "image_starter",
+            torch.zeros(1, 3, self.where_stn.image_size, self.where_stn.image_size),
+            persistent=False,
+        )
+        self.register_buffer(
+            "depth_starter", torch.full((1, 1), -float("inf")), persistent=False
+        )
         if background:
             self.register_buffer("bg_depth", torch.zeros(1))
             self.register_buffer("bg_present", torch.ones(1))
@@ -51,40 +59,18 @@ class Decoder(nn.Module):
         :param n_present: number of objects in each chunk
         :return: indices for padding tensors
         """
-        end_idx = 1
         max_objects = torch.max(n_present)
-        indices = []
-        for chunk_objects in n_present:
-            start_idx = end_idx
-            end_idx = end_idx + chunk_objects
-            if self.background:
-                idx_range = torch.cat(
-                    (
-                        torch.tensor(
-                            [end_idx - 1], dtype=torch.long, device=n_present.device
-                        ),
-                        torch.arange(
-                            start=start_idx,
-                            end=end_idx - 1,
-                            dtype=torch.long,
-                            device=n_present.device,
-                        ),
-                    ),
-                    dim=0,
-                )
-                start_pad = 0
-            else:
-                idx_range = torch.arange(
-                    start=start_idx,
-                    end=end_idx,
-                    dtype=torch.long,
-                    device=n_present.device,
-                )
-                start_pad = 1
-            indices.append(
-                functional.pad(idx_range, pad=[start_pad, max_objects - chunk_objects])
-            )
-        return torch.cat(indices)
+        end_indices = torch.cumsum(n_present, dim=0)
+        start_indices = end_indices - n_present + 1
+        positions = torch.arange(max_objects, device=n_present.device).unsqueeze(0)
+        valid = positions < n_present.unsqueeze(1)
+        if self.background:
+            # last object in each chunk (background) goes first
+            positions = (positions - 1) % n_present.clamp(min=1).unsqueeze(1)
+        indices = (start_indices.unsqueeze(1) + positions) * valid
+        if not self.background:
+            indices = functional.pad(indices, pad=[1, 0])
+        return indices.view(-1)
 
     def pad_reconstructions(
         self,
@@ -95,12 +81,8 @@ class Decoder(nn.Module):
         """Pad tensors to have identical 1. dim shape
         .. and reshape to (batch_size x n_objects x ...)
         """
-        image_starter = transformed_images.new_zeros(
-            (1, 3, self.where_stn.image_size, self.where_stn.image_size)
-        )
-        z_depth_starter = z_depth.new_full((1, 1), fill_value=-float("inf"))
-        images = torch.cat((image_starter, transformed_images), dim=0)
-        z_depth = torch.cat((z_depth_starter, z_depth), dim=0)
+        images = torch.cat((self.image_starter, transformed_images), dim=0)
+        z_depth = torch.cat((self.depth_starter, z_depth), dim=0)
         max_present = torch.max(n_present)
         padded_shape = max_present.item() + (not self.background) * 1
         indices = self.pad_indices(n_present)
@@ -145,10 +127,16 @@ class Decoder(nn.Module):
             objects, object_weights = reconstructions[:, 1:], weights[:, 1:]
         else:
             objects, object_weights = reconstructions, weights
-        weighted_images = objects * functional.softmax(object_weights, dim=1).view(
-            *object_weights.shape[:2], 1, 1, 1
+        object_weights = functional.softmax(
+            object_weights.view(*object_weights.shape[:2]), dim=1
         )
-        merged = torch.sum(weighted_images, dim=1)
+        # weighted sum as a single batched matmul (einsum fails for no objects),
+        # kept in fp32 under autocast like the sum it replaces
+        with torch.cuda.amp.autocast(enabled=False):
+            merged = torch.bmm(
+                object_weights.float().unsqueeze(1),
+                objects.float().flatten(start_dim=2),
+            ).view(objects.shape[0], *objects.shape[2:])
         if self.background:
             merged = self.fill_background(
                 merged=merged, backgrounds=reconstructions[:, 0]
@@ -183,13 +171,16 @@ class Decoder(nn.Module):
                 (z_where, self.bg_where.expand(batch_size, 1, 4)), dim=1
             )
         if self.drop:
-            present_mask = torch.eq(z_present, 1)
-            z_what = z_what[present_mask.expand_as(z_what)].view(-1, z_what.shape[-1])
-            z_where = z_where[present_mask.expand_as(z_where)].view(
-                -1, z_where.shape[-1]
+            present_mask = torch.eq(z_present, 1).view(-1)
+            present_idx = torch.nonzero(present_mask, as_tuple=True)[0]
+            z_what = z_what.reshape(-1, z_what.shape[-1]).index_select(
+                dim=0, index=present_idx
+            )
+            z_where = z_where.reshape(-1, z_where.shape[-1]).index_select(
+                dim=0, index=present_idx
             )
-            z_depth = z_depth[present_mask.expand_as(z_depth)].view(
-                -1, z_depth.shape[-1]
+            z_depth = z_depth.reshape(-1, z_depth.shape[-1]).index_select(
+                dim=0, index=present_idx
             )
         return z_what, z_where, z_present, z_depth
 
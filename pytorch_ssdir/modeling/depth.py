@@ -1,6 +1,5 @@
 """$$z_{depth}$$ encoder"""
-from itertools import chain
-from typing import List, Optional, Tuple
+from typing import Dict, List, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -14,18 +13,21 @@ class DepthEncoder(nn.Module):
     ):
         super().__init__()
         self.feature_channels = feature_channels
-        self.loc_encoders = self._build_depth_encoders()
         self.z_depth_scale_const = z_depth_scale_const
-        if self.z_depth_scale_const is None:
-            self.scale_encoders = self._build_depth_encoders()
+        self.out_channels = 1 if self.z_depth_scale_const is not None else 2
+        self.encoders = self._build_depth_encoders()
         self.init_encoders()
 
     def _build_depth_encoders(self) -> nn.ModuleList:
-        """Build conv layers list for encoding backbone output."""
+        """Build conv layers list for encoding backbone output.
+
+        .. if scale is not constant, loc and scale are encoded jointly
+           (first channel is loc, second is scale)
+        """
         layers = [
             nn.Conv2d(
                 in_channels=channels,
-                out_channels=1,
+                out_channels=self.out_channels,
                 kernel_size=3,
                 stride=1,
                 padding=1,
@@ -41,42 +43,46 @@ class DepthEncoder(nn.Module):
         .. and outputs loc and scale tensors
         .. (batch_size x sum_features(grid*grid) x 1)
         """
-        locs = []
-        scales = []
         batch_size = features[0].shape[0]
-        sequence = [features, self.loc_encoders]
+        outputs = torch.cat(
+            [
+                encoder(feature)
+                .permute(0, 2, 3, 1)
+                .reshape(batch_size, -1, self.out_channels)
+                for feature, encoder in zip(features, self.encoders)
+            ],
+            dim=1,
+        )
+        locs = outputs[..., :1]
         if self.z_depth_scale_const is None:
-            sequence.append(self.scale_encoders)
+            scales = torch.exp(outputs[..., 1:])
         else:
-            sequence.append(len(features) * [self.z_depth_scale_const])
-        for feature, loc_enc, scale_enc in zip(*sequence):
-            locs.append(
-                loc_enc(feature)
-                .permute(0, 2, 3, 1)
-                .contiguous()
-                .view(batch_size, -1, 1)
-            )
-            if self.z_depth_scale_const is None:
-                scales.append(
-                    torch.exp(scale_enc(feature))
-                    .permute(0, 2, 3, 1)
-                    .contiguous()
-                    .view(batch_size, -1, 1)
-                )
-            else:
-                scales.append(torch.full_like(locs[-1], fill_value=scale_enc))
-
-        locs = torch.cat(locs, dim=1)
-        scales = torch.cat(scales, dim=1)
+            scales = torch.full_like(locs, fill_value=self.z_depth_scale_const)
 
         return locs, scales
 
+    @staticmethod
+    def convert_separate_heads_state_dict(
+        state_dict: Dict[str, torch.Tensor]
+    ) -> Dict[str, torch.Tensor]:
+        """Convert params of separate loc and scale encoders
+        .. (loc_encoders and scale_encoders) to joint encoders params
+        """
+        converted = {}
+        for key, value in state_dict.items():
+            if key.startswith("scale_encoders."):
+                continue
+            if key.startswith("loc_encoders."):
+                scale_key = key.replace("loc_encoders.", "scale_encoders.", 1)
+                key = key.replace("loc_encoders.", "encoders.", 1)
+                if scale_key in state_dict:
+                    value = torch.cat((value, state_dict[scale_key]))
+            converted[key] = value
+        return converted
+
     def init_encoders(self):
         """Initialize model params."""
-        modules = [self.loc_encoders.modules()]
-        if self.z_depth_scale_const is None:
-            modules.append(self.scale_encoders.modules())
-        for module in chain(*modules):
+        for module in self.encoders.modules():
             if isinstance(module, nn.Conv2d):
                 nn.init.xavier_uniform_(module.weight)
                 nn.init.zeros_(module.bias)
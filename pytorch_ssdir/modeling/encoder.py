@@ -1,6 +1,7 @@
 """SSDIR encoder."""
 from copy import deepcopy
-from typing import List, Optional, Tuple
+from itertools import chain
+from typing import Any, Dict, List, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -41,6 +42,8 @@ class Encoder(nn.Module):
         reset_non_present: bool = True,
         background: bool = True,
         normalize_z_present: bool = False,
+        channels_last: bool = True,
+        cuda_streams: bool = False,
     ):
         super().__init__()
         self.ssd_backbone = ssd.backbone.requires_grad_(train_backbone)
@@ -79,6 +82,16 @@ class Encoder(nn.Module):
             z_depth_scale_const=z_depth_scale_const,
         ).requires_grad_(train_depth)
 
+        # keep conv weights and activations in NHWC, so that flattening
+        # encoders' outputs to (batch_size x n_objects x latent) is a view
+        self.channels_last = channels_last
+        if self.channels_last:
+            self.to(memory_format=torch.channels_last)
+
+        # side CUDA streams for independent encoders, created lazily per device
+        self.cuda_streams = cuda_streams
+        self._streams: Dict[torch.device, List[torch.cuda.Stream]] = {}
+
         self.register_buffer(
             "indices",
             self.latents_indices(
@@ -86,6 +99,10 @@ class Encoder(nn.Module):
                 boxes_per_loc=ssd.backbone.boxes_per_loc,
             ),
         )
+        what_indices = self.indices
+        if self.background:
+            what_indices = torch.hstack((self.indices, self.indices.max() + 1))
+        self.register_buffer("what_indices", what_indices, persistent=False)
         self.register_buffer("empty_loc", torch.tensor(0.0, dtype=torch.float))
         self.register_buffer("empty_scale", torch.tensor(1.0, dtype=torch.float))
 
@@ -102,7 +119,7 @@ class Encoder(nn.Module):
         for feature_map, n_boxes in zip(feature_maps, boxes_per_loc):
             for feature_map_idx in range(feature_map ** 2):
                 indices.append(
-                    torch.full(size=(n_boxes,), fill_value=idx, dtype=torch.float)
+                    torch.full(size=(n_boxes,), fill_value=idx, dtype=torch.long)
                 )
                 idx += 1
         return torch.cat(indices, dim=0)
@@ -129,14 +146,10 @@ class Encoder(nn.Module):
             (z_depth_loc, z_depth_scale),
         ) = latents
         # repeat rows to match z_where and z_present
-        indices = self.indices.long()
-        what_indices = indices
-        if self.background:
-            what_indices = torch.hstack((indices, indices.max() + 1))
-        z_what_loc = z_what_loc.index_select(dim=1, index=what_indices)
-        z_what_scale = z_what_scale.index_select(dim=1, index=what_indices)
-        z_depth_loc = z_depth_loc.index_select(dim=1, index=indices)
-        z_depth_scale = z_depth_scale.index_select(dim=1, index=indices)
+        z_what_loc = z_what_loc.index_select(dim=1, index=self.what_indices)
+        z_what_scale = z_what_scale.index_select(dim=1, index=self.what_indices)
+        z_depth_loc = z_depth_loc.index_select(dim=1, index=self.indices)
+        z_depth_scale = z_depth_scale.index_select(dim=1, index=self.indices)
         return (
             (z_what_loc, z_what_scale),
             z_where,
@@ -179,11 +192,85 @@ class Encoder(nn.Module):
                     ),
                 )
             )
-        z_what_loc = torch.where(what_present_mask, z_what_loc, self.empty_loc)
-        z_what_scale = torch.where(what_present_mask, z_what_scale, self.empty_scale)
-        z_where = torch.where(present_mask, z_where, self.empty_loc)
-        z_depth_loc = torch.where(present_mask, z_depth_loc, self.empty_loc)
-        z_depth_scale = torch.where(present_mask, z_depth_scale, self.empty_scale)
+        # latents may come in reduced precision under AMP (--precision 16)
+        z_what_loc = torch.where(
+            what_present_mask, z_what_loc, self.empty_loc.to(z_what_loc)
+        )
+        z_what_scale = torch.where(
+            what_present_mask, z_what_scale, self.empty_scale.to(z_what_scale)
+        )
+        z_where = torch.where(present_mask, z_where, self.empty_loc.to(z_where))
+        z_depth_loc = torch.where(
+            present_mask, z_depth_loc, self.empty_loc.to(z_depth_loc)
+        )
+        z_depth_scale = torch.where(
+            present_mask, z_depth_scale, self.empty_scale.to(z_depth_scale)
+        )
+        return (
+            (z_what_loc, z_what_scale),
+            z_where,
+            z_present,
+            (z_depth_loc, z_depth_scale),
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Drop CUDA streams, which cannot be pickled nor deep-copied."""
+        state = self.__dict__.copy()
+        state["_streams"] = {}
+        return state
+
+    def side_streams(self, device: torch.device) -> List[torch.cuda.Stream]:
+        """Get side CUDA streams for what, present and depth encoders."""
+        if device not in self._streams:
+            self._streams[device] = [torch.cuda.Stream(device=device) for _ in range(3)]
+        return self._streams[device]
+
+    def encode_features(
+        self,
+        where_present_features: Tuple[torch.Tensor, ...],
+        what_depth_features: Tuple[torch.Tensor, ...],
+    ) -> Tuple[
+        Tuple[torch.Tensor, torch.Tensor],
+        torch.Tensor,
+        torch.Tensor,
+        Tuple[torch.Tensor, torch.Tensor],
+    ]:
+        """Encode backbone features to latents using independent encoders.
+
+        .. if cuda_streams is set, on GPU what, present and depth encoders run
+           on side CUDA streams, so that their kernels overlap with the where encoder
+        """
+        if not (self.cuda_streams and where_present_features[0].is_cuda):
+            return (
+                self.what_enc(what_depth_features),
+                self.where_enc(where_present_features),
+                self.present_enc(where_present_features),
+                self.depth_enc(what_depth_features),
+            )
+        device = where_present_features[0].device
+        current_stream = torch.cuda.current_stream(device)
+        features = set(chain(where_present_features, what_depth_features))
+        outputs: List[Any] = []
+        streams = self.side_streams(device)
+        for stream, (encoder, encoder_features) in zip(
+            streams,
+            [
+                (self.what_enc, what_depth_features),
+                (self.present_enc, where_present_features),
+                (self.depth_enc, what_depth_features),
+            ],
+        ):
+            stream.wait_stream(current_stream)
+            for feature in features:
+                feature.record_stream(stream)
+            with torch.cuda.stream(stream):
+                outputs.append(encoder(encoder_features))
+        z_where = self.where_enc(where_present_features)
+        for stream in streams:
+            current_stream.wait_stream(stream)
+        (z_what_loc, z_what_scale), z_present, (z_depth_loc, z_depth_scale) = outputs
+        for latent in [z_what_loc, z_what_scale, z_present, z_depth_loc, z_depth_scale]:
+            latent.record_stream(current_stream)
         return (
             (z_what_loc, z_what_scale),
             z_where,
@@ -203,21 +290,14 @@ class Encoder(nn.Module):
         .. and outputs latent representation tuple
         .. (z_what (loc & scale), z_where, z_present, z_depth (loc & scale))
         """
+        if self.channels_last:
+            images = images.contiguous(memory_format=torch.channels_last)
         where_present_features = self.ssd_backbone(images)
         if self.clone_backbone:
             what_depth_features = self.ssd_backbone_cloned(images)
         else:
             what_depth_features = where_present_features
-        z_where = self.where_enc(where_present_features)
-        z_present = self.present_enc(where_present_features)
-        z_what_loc, z_what_scale = self.what_enc(what_depth_features)
-        z_depth_loc, z_depth_scale = self.depth_enc(what_depth_features)
-        latents = (
-            (z_what_loc, z_what_scale),
-            z_where,
-            z_present,
-            (z_depth_loc, z_depth_scale),
-        )
+        latents = self.encode_features(where_present_features, what_depth_features)
         padded_latents = self.pad_latents(latents)
         if self.reset:
             padded_latents = self.reset_non_present(padded_latents)
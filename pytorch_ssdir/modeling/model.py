@@ -98,6 +98,8 @@ class SSDIR(pl.LightningModule):
         train_backbone_layers: int = -1,
         clone_backbone: bool = False,
         reset_non_present: bool = True,
+        channels_last: bool = True,
+        cuda_streams: bool = False,
         visualize_inference: bool = True,
         visualize_inference_freq: int = 500,
         n_visualize_objects: int = 10,
@@ -145,6 +147,8 @@ class SSDIR(pl.LightningModule):
         :param train_backbone_layers: n layers to train in the backbone (neg for all)
         :param clone_backbone: clone backbone for depth and what encoders
         :param reset_non_present: set non-present latents to some ordinary ones
+        :param channels_last: run encoder in channels last (NHWC) memory format
+        :param cuda_streams: run independent encoders on side CUDA streams
         :param visualize_inference: visualize inference
         :param visualize_inference_freq: how often to visualize inference
         :param n_visualize_objects: number of objects to visualize
@@ -170,6 +174,8 @@ class SSDIR(pl.LightningModule):
             reset_non_present=reset_non_present,
             background=background,
             normalize_z_present=normalize_z_present,
+            channels_last=channels_last,
+            cuda_streams=cuda_streams,
         )
         self.decoder = Decoder(
             ssd=ssd_model,
@@ -240,6 +246,13 @@ class SSDIR(pl.LightningModule):
                 ssd_model.backbone.feature_maps, ssd_model.backbone.boxes_per_loc
             )
         )
+        # per-sample elbo components' numels (batch size may be tuned later)
+        n_objects = self.n_ssd_features + self.background * 1
+        self._what_numel = n_objects * self.z_what_size
+        self._present_numel = n_objects
+        self._depth_numel = n_objects
+        self._rec_numel = 3 * 64 * 64
+        self._obs_numel = 3 * self.image_size[0] * self.image_size[1]
 
         self.save_hyperparameters()
 
@@ -516,6 +529,22 @@ class SSDIR(pl.LightningModule):
             default=False,
             help="Reset non-present objects' latents to more ordinary",
         )
+        parser.add_argument(
+            "--channels_last",
+            type=str2bool,
+            nargs="?",
+            const=True,
+            default=True,
+            help="Run encoder in channels last memory format",
+        )
+        parser.add_argument(
+            "--cuda_streams",
+            type=str2bool,
+            nargs="?",
+            const=True,
+            default=False,
+            help="Run independent encoders on side CUDA streams (experimental)",
+        )
         parser.add_argument(
             "--flip_train",
             type=str2bool,
@@ -578,9 +607,9 @@ class SSDIR(pl.LightningModule):
             z_present,
             (z_depth_loc, z_depth_scale),
         ) = self.encoder(inputs)
-        z_what = dist.Normal(z_what_loc, z_what_scale).sample()
-        z_present = dist.Bernoulli(z_present).sample()
-        z_depth = dist.Normal(z_depth_loc, z_depth_scale).sample()
+        z_what = z_what_loc + z_what_scale * torch.randn_like(z_what_loc)
+        z_present = torch.lt(torch.rand_like(z_present), z_present).to(z_present.dtype)
+        z_depth = z_depth_loc + z_depth_scale * torch.randn_like(z_depth_loc)
         return z_what, z_where, z_present, z_depth
 
     @staticmethod
@@ -591,6 +620,19 @@ class SSDIR(pl.LightningModule):
         max_values = max_values.unsqueeze(-1).unsqueeze(-1).expand_as(reconstructions)
         return reconstructions / max_values
 
+    @staticmethod
+    def bernoulli_log_likelihood(
+        probs: torch.Tensor, obs: torch.Tensor
+    ) -> torch.Tensor:
+        """Get per-image Bernoulli log-likelihood of observations.
+
+        .. probs are clamped like in pyro, NaN probs result in NaN log-likelihood
+        """
+        eps = torch.finfo(probs.dtype).eps
+        probs = probs.clamp(min=eps, max=1 - eps)
+        log_likelihood = obs * probs.log() + (1 - obs) * (-probs).log1p()
+        return log_likelihood.sum(dim=(1, 2, 3))
+
     def decoder_forward(
         self, latents: Tuple[torch.Tensor, torch.Tensor, torch.Tensor, torch.Tensor]
     ) -> torch.Tensor:
@@ -608,11 +650,7 @@ class SSDIR(pl.LightningModule):
         """Calculate what sampling elbo coefficient."""
         coef = self._what_coef
         if self.normalize_elbo:
-            coef /= (
-                self.batch_size
-                * (self.n_ssd_features + self.background * 1)
-                * self.z_what_size
-            )
+            coef /= self.batch_size * self._what_numel
         return coef
 
     @property
@@ -620,7 +658,7 @@ class SSDIR(pl.LightningModule):
         """Calculate present sampling elbo coefficient."""
         coef = self._present_coef
         if self.normalize_elbo:
-            coef /= self.batch_size * (self.n_ssd_features + self.background * 1)
+            coef /= self.batch_size * self._present_numel
         return coef
 
     @property
@@ -628,7 +666,7 @@ class SSDIR(pl.LightningModule):
         """Calculate depth sampling elbo coefficient."""
         coef = self._depth_coef
         if self.normalize_elbo:
-            coef /= self.batch_size * (self.n_ssd_features + self.background * 1)
+            coef /= self.batch_size * self._depth_numel
         return coef
 
     @property
@@ -639,7 +677,7 @@ class SSDIR(pl.LightningModule):
         """
         coef = self._rec_coef
         if self.normalize_elbo:
-            coef /= self.batch_size * 3 * 64 * 64
+            coef /= self.batch_size * self._rec_numel
         return coef
 
     @property
@@ -647,7 +685,7 @@ class SSDIR(pl.LightningModule):
         """Calculate reconstruction sampling elbo coefficient (entire image)."""
         coef = self._obs_coef
         if self.normalize_elbo:
-            coef /= self.batch_size * 3 * self.image_size[0] * self.image_size[1]
+            coef /= self.batch_size * self._obs_numel
         return coef
 
     def model(self, x: torch.Tensor):
@@ -713,7 +751,7 @@ class SSDIR(pl.LightningModule):
             if self.normalize_reconstructions:
                 output = self.normalize_output(output)
             with poutine.scale(scale=self.obs_coef):
-                pyro.sample("obs", dist.Bernoulli(output).to_event(3), obs=obs)
+                pyro.factor("obs", self.bernoulli_log_likelihood(output, obs))
 
         with pyro.plate("reconstructions"):
             if self.rec_coef:
@@ -1035,6 +1073,31 @@ class SSDIR(pl.LightningModule):
         """Step for validation."""
         return self.common_run_step(batch, batch_nb, stage="val")
 
+    def on_load_checkpoint(self, checkpoint: Dict[str, Any]):
+        """Convert checkpoint params saved in previous modules' layouts."""
+        state_dict = checkpoint["state_dict"]
+        for prefix, convert in [
+            (
+                "encoder.what_enc.",
+                self.encoder.what_enc.convert_separate_heads_state_dict,
+            ),
+            (
+                "encoder.depth_enc.",
+                self.encoder.depth_enc.convert_separate_heads_state_dict,
+            ),
+            (
+                "decoder.what_dec.",
+                self.decoder.what_dec.convert_conv_transpose_state_dict,
+            ),
+        ]:
+            module_state_dict = {
+                key[len(prefix) :]: state_dict.pop(key)
+                for key in list(state_dict)
+                if key.startswith(prefix)
+            }
+            for key, value in convert(module_state_dict).items():
+                state_dict[prefix + key] = value
+
     def configure_optimizers(self):
         """Configure training optimizer."""
         if self.ssd_lr_multiplier != 1:
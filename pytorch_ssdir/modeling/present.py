@@ -28,8 +28,7 @@ class PresentEncoder(nn.Module):
             logits = torch.sigmoid(
                 cls_header(feature)
                 .permute(0, 2, 3, 1)
-                .contiguous()
-                .view(batch_size, -1, self.n_classes)
+                .reshape(batch_size, -1, self.n_classes)
             )
             max_values, max_indices = torch.max(logits, dim=-1, keepdim=True)
             present = torch.zeros_like(max_values)
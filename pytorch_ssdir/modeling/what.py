@@ -1,6 +1,7 @@
 """$$z_{what}$$ encoder and decoder."""
-from itertools import chain
-from typing import List, Optional, Tuple
+from copy import deepcopy
+from itertools import accumulate
+from typing import Dict, List, Optional, Tuple
 
 import torch
 import torch.nn as nn
@@ -24,26 +25,30 @@ class WhatEncoder(nn.Module):
         self.feature_maps = feature_maps
         self.n_hidden = n_hidden
         self.background = background
-        feature_idx = self.feature_maps.index(min(self.feature_maps))
-        self.loc_encoders = self._build_what_encoders()
-        self.bg_loc_encoder = (
-            self._build_feature_encoder(self.feature_channels[feature_idx])
+        self.z_what_scale_const = z_what_scale_const
+        self.n_heads = 1 if z_what_scale_const is not None else 2
+        self.out_channels = self.n_heads * self.out_size
+        self.bg_feature_idx = self.feature_maps.index(min(self.feature_maps))
+        self.encoders = self._build_what_encoders()
+        self.bg_encoder = (
+            self._build_feature_encoder(self.feature_channels[self.bg_feature_idx])
             if background
             else None
         )
-        self.z_what_scale_const = z_what_scale_const
-        if z_what_scale_const is None:
-            self.scale_encoders = self._build_what_encoders()
-            self.bg_scale_encoder = (
-                self._build_feature_encoder(self.feature_channels[feature_idx])
-                if background
-                else None
-            )
+        # objects' grid sizes and offsets in the output (background goes last)
+        self.grid_sizes = list(self.feature_maps)
+        if background:
+            self.grid_sizes.append(self.feature_maps[self.bg_feature_idx])
+        self.offsets = [0, *accumulate(size ** 2 for size in self.grid_sizes)]
         self.init_encoders()
 
     def _build_feature_encoder(self, in_channels: int) -> nn.Module:
-        """Prepare single feature encoder."""
-        hid_size = 2 * self.out_size
+        """Prepare single feature encoder.
+
+        .. if scale is not constant, loc and scale encoders are computed jointly
+           as grouped convs (first out_size channels are locs, the rest are scales)
+        """
+        hid_size = 2 * self.out_size * self.n_heads
         layers = [
             nn.Conv2d(in_channels=in_channels, out_channels=hid_size, kernel_size=1)
         ]
@@ -56,12 +61,18 @@ class WhatEncoder(nn.Module):
                         kernel_size=3,
                         stride=1,
                         padding=1,
+                        groups=self.n_heads,
                     ),
                     nn.ReLU(),
                 ]
             )
         layers.append(
-            nn.Conv2d(in_channels=hid_size, out_channels=self.out_size, kernel_size=1)
+            nn.Conv2d(
+                in_channels=hid_size,
+                out_channels=self.out_channels,
+                kernel_size=1,
+                groups=self.n_heads,
+            )
         )
         return nn.Sequential(*layers)
 
@@ -79,68 +90,63 @@ class WhatEncoder(nn.Module):
         .. and outputs locs and scales tensors
         .. (batch_size x sum_features(grid*grid) x z_what_size)
         """
-        locs = []
-        scales = []
         batch_size = features[0].shape[0]
-        sequence = [features, self.loc_encoders]
+        encoders = list(zip(features, self.encoders))
+        if self.background:
+            encoders.append((features[self.bg_feature_idx], self.bg_encoder))
+        outputs = features[0].new_empty(
+            (batch_size, self.offsets[-1], self.out_channels)
+        )
+        for idx, (feature, encoder) in enumerate(encoders):
+            # write NCHW encoder output directly into (NHWC) output slot
+            grid_size = self.grid_sizes[idx]
+            outputs[:, self.offsets[idx] : self.offsets[idx + 1]].view(
+                batch_size, grid_size, grid_size, self.out_channels
+            ).permute(0, 3, 1, 2).copy_(encoder(feature))
+
+        locs = outputs[..., : self.out_size]
         if self.z_what_scale_const is None:
-            sequence.append(self.scale_encoders)
+            # out-of-place, so that exp is computed in fp32 under autocast
+            scales = torch.exp(outputs[..., self.out_size :])
         else:
-            sequence.append(len(features) * [self.z_what_scale_const])
-        for feature, loc_enc, scale_enc in zip(*sequence):
-            locs.append(
-                loc_enc(feature)
-                .permute(0, 2, 3, 1)
-                .contiguous()
-                .view(batch_size, -1, self.out_size)
-            )
-            if self.z_what_scale_const is None:
-                scales.append(
-                    torch.exp(scale_enc(feature))
-                    .permute(0, 2, 3, 1)
-                    .contiguous()
-                    .view(batch_size, -1, self.out_size)
-                )
-            else:
-                scales.append(torch.full_like(locs[-1], fill_value=scale_enc))
-        if self.background:
-            bg_feature_idx = self.feature_maps.index(min(self.feature_maps))
-            locs.append(
-                self.bg_loc_encoder(features[bg_feature_idx])
-                .permute(0, 2, 3, 1)
-                .contiguous()
-                .view(batch_size, -1, self.out_size)
-            )
-            if self.z_what_scale_const is None:
-                scales.append(
-                    torch.exp(self.bg_scale_encoder(features[bg_feature_idx]))
-                    .permute(0, 2, 3, 1)
-                    .contiguous()
-                    .view(batch_size, -1, self.out_size)
-                )
-            else:
-                scales.append(
-                    torch.full_like(locs[-1], fill_value=self.z_what_scale_const)
-                )
-
-        locs = torch.cat(locs, dim=1)
-        scales = torch.cat(scales, dim=1)
+            scales = torch.full_like(locs, fill_value=self.z_what_scale_const)
 
         return locs, scales
 
     def init_encoders(self):
-        """Initialize model params."""
-        modules = [self.loc_encoders.modules()]
+        """Initialize model params.
+
+        .. joint loc and scale weights are initialized separately
+        """
+        encoders = list(self.encoders)
         if self.background:
-            modules.append(self.bg_loc_encoder.modules())
-        if self.z_what_scale_const is None:
-            modules.append(self.scale_encoders.modules())
-            if self.background:
-                modules.append(self.bg_scale_encoder.modules())
-        for module in chain(*modules):
-            if isinstance(module, nn.Conv2d):
-                nn.init.xavier_uniform_(module.weight)
-                nn.init.zeros_(module.bias)
+            encoders.append(self.bg_encoder)
+        for encoder in encoders:
+            for module in encoder.modules():
+                if isinstance(module, nn.Conv2d):
+                    for weight in module.weight.chunk(self.n_heads):
+                        nn.init.xavier_uniform_(weight)
+                    nn.init.zeros_(module.bias)
+
+    @staticmethod
+    def convert_separate_heads_state_dict(
+        state_dict: Dict[str, torch.Tensor]
+    ) -> Dict[str, torch.Tensor]:
+        """Convert params of separate loc and scale encoders
+        .. (loc_encoders, scale_encoders, bg_loc_encoder and bg_scale_encoder)
+        .. to joint encoders params
+        """
+        converted = {}
+        for key, value in state_dict.items():
+            if key.startswith(("scale_encoders.", "bg_scale_encoder.")):
+                continue
+            if key.startswith(("loc_encoders.", "bg_loc_encoder.")):
+                scale_key = key.replace("loc_encoder", "scale_encoder", 1)
+                key = key.replace("loc_encoder", "encoder", 1)
+                if scale_key in state_dict:
+                    value = torch.cat((value, state_dict[scale_key]))
+            converted[key] = value
+        return converted
 
 
 class WhatDecoder(nn.Module):
@@ -151,34 +157,118 @@ class WhatDecoder(nn.Module):
         self.h_size = z_what_size
         layers = [
             nn.Conv2d(self.h_size, 1024, kernel_size=1),
-            nn.ReLU(),
-            nn.ConvTranspose2d(1024, 512, kernel_size=2, stride=2),
-            nn.ReLU(),
-            nn.ConvTranspose2d(512, 256, kernel_size=2, stride=2),
-            nn.ReLU(),
-            nn.ConvTranspose2d(256, 128, kernel_size=2, stride=2),
-            nn.ReLU(),
-            nn.ConvTranspose2d(128, 64, kernel_size=2, stride=2),
-            nn.ReLU(),
-            nn.ConvTranspose2d(64, 32, kernel_size=2, stride=2),
-            nn.ReLU(),
-            nn.ConvTranspose2d(32, 16, kernel_size=2, stride=2),
-            nn.ReLU(),
+            nn.ReLU(inplace=True),
+            *self._build_upscale_block(1024, 512),
+            *self._build_upscale_block(512, 256),
+            *self._build_upscale_block(256, 128),
+            *self._build_upscale_block(128, 64),
+            *self._build_upscale_block(64, 32),
+            *self._build_upscale_block(32, 16),
             nn.Conv2d(16, 3, kernel_size=1),
             nn.Sigmoid(),
         ]
         self.decoder = nn.Sequential(*layers)
         self.init_decoder()
 
+    @staticmethod
+    def _build_upscale_block(in_channels: int, out_channels: int) -> List[nn.Module]:
+        """Prepare layers upscaling feature maps twice.
+
+        .. pointwise conv and pixel shuffle, a superset of
+           ConvTranspose2d(kernel_size=2, stride=2) followed by ReLU
+           (each sub-pixel has its own bias; see upscale_conv_params)
+        """
+        return [
+            nn.Conv2d(in_channels, 4 * out_channels, kernel_size=1),
+            nn.ReLU(inplace=True),
+            nn.PixelShuffle(upscale_factor=2),
+        ]
+
+    @staticmethod
+    def upscale_conv_params(
+        weight: torch.Tensor, bias: torch.Tensor
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Convert ConvTranspose2d(kernel_size=2, stride=2) params
+        .. to the upscale block pointwise conv params computing the same function
+
+        .. conv.weight[4 * o + 2 * i + j, c] = conv_transpose.weight[c, o, i, j]
+        """
+        in_channels, out_channels = weight.shape[:2]
+        return (
+            weight.permute(1, 2, 3, 0).reshape(4 * out_channels, in_channels, 1, 1),
+            bias.repeat_interleave(4),
+        )
+
+    def convert_conv_transpose_state_dict(
+        self, state_dict: Dict[str, torch.Tensor]
+    ) -> Dict[str, torch.Tensor]:
+        """Convert params of the decoder with ConvTranspose2d upscaling layers
+        .. (layout preceding pixel shuffle upscale blocks) to the current layout
+
+        .. params in the current layout are returned unchanged
+        """
+        if not any(value.shape[-2:] == (2, 2) for value in state_dict.values()):
+            return state_dict
+        conv_indices = [
+            idx
+            for idx, layer in enumerate(self.decoder)
+            if isinstance(layer, nn.Conv2d)
+        ]
+        converted = {}
+        for old_idx, new_idx in zip(range(0, 2 * len(conv_indices), 2), conv_indices):
+            weight = state_dict[f"decoder.{old_idx}.weight"]
+            bias = state_dict[f"decoder.{old_idx}.bias"]
+            if weight.shape[-2:] == (2, 2):
+                weight, bias = self.upscale_conv_params(weight, bias)
+            converted[f"decoder.{new_idx}.weight"] = weight
+            converted[f"decoder.{new_idx}.bias"] = bias
+        return converted
+
     def forward(self, z_what: torch.Tensor) -> torch.Tensor:
         """Takes z_what latent (sum_features(grid*grid) x z_what_size)
         .. and outputs decoded image (sum_features(grid*grid) x 3 x 64 x 64)
         """
-        return self.decoder(z_what.view(-1, self.h_size, 1, 1))
+        return self.decoder(z_what.reshape(-1, self.h_size, 1, 1))
 
     def init_decoder(self):
         """Initialize model params."""
         for module in self.decoder.modules():
-            if isinstance(module, (nn.Conv2d, nn.ConvTranspose2d)):
+            if isinstance(module, nn.Conv2d):
                 nn.init.xavier_uniform_(module.weight)
                 nn.init.zeros_(module.bias)
+
+    def export_for_inference(self) -> torch.jit.ScriptModule:
+        """Get frozen TorchScript copy of the decoder for inference."""
+        scripted = torch.jit.script(self)
+        scripted.eval()
+        return torch.jit.freeze(scripted)
+
+    def quantize(self, n_calibration_samples: int = 256) -> "WhatDecoder":
+        """Get int8 statically quantized copy of the decoder for (CPU) inference.
+
+        .. conv and ReLU layers are fused, activations are calibrated
+           on z_what sampled from N(0, 1) prior
+        """
+        decoder = deepcopy(self).eval()
+        layers = list(decoder.decoder)
+        torch.quantization.fuse_modules(
+            decoder.decoder,
+            [
+                [str(idx), str(idx + 1)]
+                for idx, (layer, next_layer) in enumerate(zip(layers, layers[1:]))
+                if isinstance(layer, nn.Conv2d) and isinstance(next_layer, nn.ReLU)
+            ],
+            inplace=True,
+        )
+        decoder.decoder = nn.Sequential(
+            torch.quantization.QuantStub(),
+            *decoder.decoder,
+            torch.quantization.DeQuantStub(),
+        )
+        decoder.qconfig = torch.quantization.get_default_qconfig(
+            torch.backends.quantized.engine
+        )
+        torch.quantization.prepare(decoder, inplace=True)
+        with torch.no_grad():
+            decoder(torch.randn(n_calibration_samples, self.h_size))
+        return torch.quantization.convert(decoder, inplace=True)
@@ -1,5 +1,4 @@
 """$$z_{where}$$ encoder and decoder."""
-import warnings
 from typing import Tuple
 
 import torch
@@ -8,11 +7,6 @@ import torch.nn.functional as functional
 from pytorch_ssd.data.bboxes import convert_locations_to_boxes
 from pytorch_ssd.modeling.box_predictors import SSDBoxPredictor
 
-warnings.filterwarnings(
-    "ignore",
-    message="Default grid_sample and affine_grid behavior has changed",
-)
-
 
 class WhereEncoder(nn.Module):
     """Module encoding input image features to where latent params.
@@ -40,14 +34,8 @@ class WhereEncoder(nn.Module):
     @staticmethod
     def convert_to_square(boxes: torch.Tensor) -> torch.Tensor:
         """Convert rectangular boxes to squares by taking max(height, width)."""
-        wh = (
-            (torch.argmax(boxes[..., 2:], dim=-1) + 2)
-            .unsqueeze(-1)
-            .expand(*boxes.shape[:-1], 2)
-        )
-        xy = wh.new_tensor([0, 1]).expand_as(wh)
-        index = torch.cat((xy, wh), dim=-1)
-        return torch.gather(boxes, dim=-1, index=index)
+        wh = torch.amax(boxes[..., 2:], dim=-1, keepdim=True)
+        return torch.cat((boxes[..., :2], wh.expand(*boxes.shape[:-1], 2)), dim=-1)
 
     def forward(self, features: Tuple[torch.Tensor, ...]) -> torch.Tensor:
         """Takes tuple of tensors (batch_size x grid x grid x features)
@@ -58,10 +46,7 @@ class WhereEncoder(nn.Module):
         batch_size = features[0].shape[0]
         for feature, reg_header in zip(features, self.ssd_loc_reg_headers):
             where.append(
-                reg_header(feature)
-                .permute(0, 2, 3, 1)
-                .contiguous()
-                .view(batch_size, -1, 4)
+                reg_header(feature).permute(0, 2, 3, 1).reshape(batch_size, -1, 4)
             )
 
         where_locations = torch.cat(where, dim=1)
@@ -85,6 +70,9 @@ class WhereTransformer(nn.Module):
         super().__init__()
         self.image_size = image_size
         self.inverse = inverse
+        self.register_buffer(
+            "theta_index", torch.tensor([3, 0, 1, 0, 4, 2]), persistent=False
+        )
 
     @staticmethod
     def scale_boxes(where_boxes: torch.Tensor) -> torch.Tensor:
@@ -96,14 +84,15 @@ class WhereTransformer(nn.Module):
         :param where_boxes: latent - detection box
         :return: scaled box
         """
-        xy = where_boxes[..., :2]
-        wh = where_boxes[..., 2:]
-        scaled_wh = 1 / wh
-        scaled_xy = (1 - 2 * xy) * scaled_wh
-        return torch.cat((scaled_xy, scaled_wh), dim=-1)
+        scaled_boxes = torch.empty_like(where_boxes)
+        scaled_wh = torch.reciprocal(where_boxes[..., 2:])
+        scaled_boxes[..., 2:] = scaled_wh
+        scaled_boxes[..., :2] = torch.addcmul(
+            scaled_wh, where_boxes[..., :2], scaled_wh, value=-2
+        )
+        return scaled_boxes
 
-    @staticmethod
-    def convert_boxes_to_theta(where_boxes: torch.Tensor) -> torch.Tensor:
+    def convert_boxes_to_theta(self, where_boxes: torch.Tensor) -> torch.Tensor:
         """Convert where latents to transformation matrix.
 
         .. [ w_scale    0    x_translation ]
@@ -114,23 +103,24 @@ class WhereTransformer(nn.Module):
         """
         n_boxes = where_boxes.shape[0]
         transformation_mtx = torch.cat(
-            (torch.zeros((n_boxes, 1), device=where_boxes.device), where_boxes), dim=1
+            (where_boxes.new_zeros((n_boxes, 1)), where_boxes), dim=1
+        )
+        return transformation_mtx.index_select(dim=1, index=self.theta_index).view(
+            n_boxes, 2, 3
         )
-        return transformation_mtx.index_select(
-            dim=1,
-            index=torch.tensor([3, 0, 1, 0, 4, 2], device=where_boxes.device),
-        ).view(n_boxes, 2, 3)
 
-    @staticmethod
-    def get_inverse_theta(theta: torch.Tensor) -> torch.Tensor:
+    def get_inverse_theta(self, theta: torch.Tensor) -> torch.Tensor:
         """Get inverse transformation matrix.
 
+        .. [ 1 / w_scale       0       -x_translation / w_scale ]
+           [      0       1 / h_scale  -y_translation / h_scale ]
+
         :param theta: transformation matrix for transposing and scaling
         :return: inverted transformation matrix
         """
-        last_row = theta.new_tensor([0.0, 0.0, 1.0]).expand(theta.shape[0], 1, 3)
-        transformation_mtx = torch.cat((theta, last_row), dim=1)
-        return transformation_mtx.inverse()[:, :-1]
+        scale = torch.stack((theta[:, 0, 0], theta[:, 1, 1]), dim=-1).reciprocal()
+        translation = -theta[:, :, 2] * scale
+        return self.convert_boxes_to_theta(torch.cat((translation, scale), dim=-1))
 
     def forward(
         self, decoded_images: torch.Tensor, where_boxes: torch.Tensor
@@ -151,10 +141,12 @@ class WhereTransformer(nn.Module):
             grid = functional.affine_grid(
                 theta=theta,
                 size=[n_objects, channels, self.image_size, self.image_size],
+                align_corners=False,
             )
             transformed_images = functional.grid_sample(
                 input=decoded_images,
                 grid=grid,
+                align_corners=False,
             )
         else:
             transformed_images = decoded_images.view(
@@ -114,6 +114,18 @@ def test_merge_reconstructions(inputs, weights, expected, ssd_model):
     assert torch.all(torch.le(torch.abs(merged - expected), 1e-3))
 
 
+def test_merge_reconstructions_fp32(ssd_model):
+    """Verify if reconstructions are merged in fp32 for reduced precision inputs."""
+    decoder = Decoder(ssd=ssd_model, z_what_size=4, background=False)
+    inputs = torch.rand(2, 3, 3, 4, 4)
+    weights = torch.rand(2, 3, 1)
+    merged = decoder.merge_reconstructions(inputs.half(), weights=weights)
+    assert merged.dtype == torch.float
+    assert torch.allclose(
+        merged, decoder.merge_reconstructions(inputs.half().float(), weights)
+    )
+
+
 def test_fill_background():
     """Verify adding background to merged reconstructions."""
     background_1 = torch.full((1, 3, 1, 2), fill_value=0.3)
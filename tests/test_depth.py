@@ -1,6 +1,7 @@
 """Test depth modules."""
 import pytest
 import torch
+import torch.nn as nn
 
 from pytorch_ssdir.modeling.depth import DepthEncoder
 
@@ -42,3 +43,33 @@ def test_depth_encoder_constant_scale():
     )
     locs, scales = encoder(inputs)
     assert torch.all(scales == z_depth_scale_const)
+
+
+@pytest.mark.parametrize("z_depth_scale_const", [None, 0.1])
+def test_depth_encoder_single_conv_per_feature(z_depth_scale_const):
+    """Verify if depth loc and scale are encoded by one conv per feature map."""
+    encoder = DepthEncoder(
+        feature_channels=[3, 7], z_depth_scale_const=z_depth_scale_const
+    )
+    convs = [module for module in encoder.modules() if isinstance(module, nn.Conv2d)]
+    assert len(convs) == 2
+    assert all(conv.out_channels == encoder.out_channels for conv in convs)
+
+
+def test_depth_encoder_convert_separate_heads_state_dict():
+    """Verify if joint depth encoder reproduces separate loc and scale encoders."""
+    loc_encoder = DepthEncoder(feature_channels=[3, 7], z_depth_scale_const=1.0)
+    scale_encoder = DepthEncoder(feature_channels=[3, 7], z_depth_scale_const=1.0)
+    state_dict = {}
+    for name, encoder in [("loc", loc_encoder), ("scale", scale_encoder)]:
+        for key, value in encoder.state_dict().items():
+            state_dict[f"{name}_{key}"] = value
+    encoder = DepthEncoder(feature_channels=[3, 7])
+    encoder.load_state_dict(DepthEncoder.convert_separate_heads_state_dict(state_dict))
+    inputs = [torch.rand(2, 3, 5, 5), torch.rand(2, 7, 3, 3)]
+    with torch.no_grad():
+        locs, scales = encoder(inputs)
+        expected_locs, _ = loc_encoder(inputs)
+        scale_logits, _ = scale_encoder(inputs)
+    assert torch.allclose(locs, expected_locs, atol=1e-6)
+    assert torch.allclose(scales, torch.exp(scale_logits), atol=1e-6)
@@ -1,4 +1,6 @@
 """Test SSDIR encoder"""
+from copy import deepcopy
+
 import pytest
 import torch
 
@@ -112,6 +114,7 @@ def test_latents_indices(ssd_model, n_ssd_features):
         boxes_per_loc=ssd_model.backbone.boxes_per_loc,
     )
     assert indices.shape == (n_ssd_features,)
+    assert indices.dtype == torch.long
     assert indices.unique().numel() == sum(
         features ** 2 for features in ssd_model.backbone.feature_maps
     )
@@ -224,3 +227,60 @@ def test_reset_non_present(background, ssd_model):
     assert (reset_z_depth_loc[0][1] == encoder.empty_loc).all()
     assert (reset_z_depth_scale[0][1] == reset_z_depth_scale[0][2]).all()
     assert (reset_z_depth_scale[0][1] == encoder.empty_scale).all()
+
+
+@pytest.mark.parametrize("channels_last", [True, False])
+def test_encoder_channels_last(channels_last, ssd_model):
+    """Verify if encoder conv weights are kept in channels_last memory format."""
+    encoder = Encoder(ssd=ssd_model, channels_last=channels_last)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    for param in encoder.parameters():
+        if param.dim() == 4:
+            assert param.is_contiguous(memory_format=memory_format)
+
+
+def test_encoder_cuda_streams_state(ssd_model):
+    """Verify if side CUDA streams are opt-in and dropped when copying encoder."""
+    assert not Encoder(ssd=ssd_model).cuda_streams
+    encoder = Encoder(ssd=ssd_model, cuda_streams=True)
+    encoder._streams[torch.device("cuda", 0)] = [lambda: None]
+    assert deepcopy(encoder)._streams == {}
+    assert encoder._streams
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="CUDA is not available")
+def test_encoder_cuda_streams_parity(ssd_model):
+    """Verify if encoding on side CUDA streams matches sequential encoding."""
+    encoder = Encoder(ssd=ssd_model).cuda().eval()
+    images = torch.rand(2, 3, *ssd_model.image_size, device="cuda")
+    results = []
+    for cuda_streams in [False, True]:
+        encoder.cuda_streams = cuda_streams
+        encoder.zero_grad()
+        (
+            (z_what_loc, z_what_scale),
+            z_where,
+            z_present,
+            (z_depth_loc, z_depth_scale),
+        ) = encoder(images)
+        latents = [
+            z_what_loc,
+            z_what_scale,
+            z_where,
+            z_present,
+            z_depth_loc,
+            z_depth_scale,
+        ]
+        sum(latent.sum() for latent in latents).backward()
+        grads = [
+            param.grad.clone()
+            for param in encoder.parameters()
+            if param.grad is not None
+        ]
+        results.append(([latent.detach() for latent in latents], grads))
+    torch.cuda.synchronize()
+    (sequential_latents, sequential_grads), (streams_latents, streams_grads) = results
+    for sequential, streams in zip(sequential_latents, streams_latents):
+        assert torch.allclose(sequential, streams, atol=1e-5)
+    for sequential, streams in zip(sequential_grads, streams_grads):
+        assert torch.allclose(sequential, streams, rtol=1e-4, atol=1e-5)
@@ -1,6 +1,8 @@
 """Test SSDIR model."""
+import pyro.distributions as dist
 import pytest
 import torch
+from pyro.infer import Trace_ELBO
 
 from pytorch_ssdir.modeling.model import SSDIR
 
@@ -44,6 +46,75 @@ def test_ssdir_normalize_output():
     assert (torch.max(normalized.view(5, -1), dim=1)[0] == 1).all()
 
 
+@pytest.mark.parametrize("binary_obs", [True, False])
+def test_ssdir_bernoulli_log_likelihood(binary_obs):
+    """Verify obs log-likelihood matches pyro Bernoulli, propagating NaN."""
+    probs = torch.rand(3, 8, 8, 3)
+    probs[0, 0, 0] = 0.0
+    probs[0, 0, 1] = 1.0
+    probs[1, 2, 3] = float("nan")
+    obs = torch.rand(3, 8, 8, 3)
+    if binary_obs:
+        obs = obs.round()
+    expected = dist.Bernoulli(probs, validate_args=False).to_event(3).log_prob(obs)
+    log_likelihood = SSDIR.bernoulli_log_likelihood(probs, obs)
+    assert log_likelihood.shape == (3,)
+    assert torch.isnan(log_likelihood[1])
+    assert torch.allclose(log_likelihood[[0, 2]], expected[[0, 2]])
+    assert torch.isnan(expected[1])
+
+
+def test_ssdir_elbo_nan_for_empty_image(ssd_model, monkeypatch):
+    """Verify if image without present objects results in NaN loss, not error."""
+    model = SSDIR(
+        ssd_model=ssd_model,
+        dataset_name="MNIST",
+        data_dir="test",
+        z_what_size=4,
+        batch_size=2,
+        drop=True,
+        background=False,
+        normalize_reconstructions=False,
+        rec_coef=0.0,
+    )
+    z_present = torch.zeros(2, model.n_ssd_features, 1)
+    z_present[1, :4] = 1.0  # first image is padded with the starter only
+    monkeypatch.setattr(
+        model.encoder.present_enc, "forward", lambda features: z_present
+    )
+    inputs = torch.rand(2, 3, *ssd_model.image_size)
+    loss = Trace_ELBO().differentiable_loss(model.model, model.guide, inputs)
+    assert torch.isnan(loss)
+
+
+def test_ssdir_on_load_checkpoint(ssd_model):
+    """Verify if checkpoint with separate loc and scale encoders is converted."""
+    model = SSDIR(
+        ssd_model=ssd_model, dataset_name="MNIST", data_dir="test", z_what_size=4
+    )
+    state_dict = model.state_dict()
+    legacy_state_dict = {}
+    for key, value in state_dict.items():
+        for prefix in ["encoder.what_enc.", "encoder.depth_enc."]:
+            if key.startswith(prefix):
+                loc_value, scale_value = value.chunk(2)
+                for name, head_value in [("loc", loc_value), ("scale", scale_value)]:
+                    head_key = key[len(prefix) :].replace(
+                        "encoder", f"{name}_encoder", 1
+                    )
+                    legacy_state_dict[prefix + head_key] = head_value
+                break
+        else:
+            legacy_state_dict[key] = value
+    checkpoint = {"state_dict": legacy_state_dict}
+    model.on_load_checkpoint(checkpoint)
+    assert checkpoint["state_dict"].keys() == state_dict.keys()
+    assert all(
+        torch.equal(checkpoint["state_dict"][key], value)
+        for key, value in state_dict.items()
+    )
+
+
 @pytest.mark.parametrize("z_what_size", [2, 4])
 @pytest.mark.parametrize("batch_size", [2, 3])
 @pytest.mark.parametrize("drop", [True, False])
@@ -1,6 +1,7 @@
 """Test what modules."""
 import pytest
 import torch
+import torch.nn as nn
 
 from pytorch_ssdir.modeling.what import WhatDecoder, WhatEncoder
 
@@ -65,6 +66,45 @@ def test_what_encoder_constant_scale():
     assert torch.all(scales == z_what_scale_const)
 
 
+@pytest.mark.parametrize(
+    "z_what_scale_const, expected_channels", [(None, 14), (0.1, 7)]
+)
+def test_what_encoder_joint_loc_scale(z_what_scale_const, expected_channels):
+    """Verify if what encoder predicts locs and scales with a single conv."""
+    encoder = WhatEncoder(
+        z_what_size=7,
+        feature_channels=[4, 6],
+        feature_maps=[5, 3],
+        z_what_scale_const=z_what_scale_const,
+        n_hidden=1,
+    )
+    for feature_encoder in [*encoder.encoders, encoder.bg_encoder]:
+        assert feature_encoder[-1].out_channels == expected_channels
+
+
+@pytest.mark.parametrize("n_hidden", [-1, 0, 2])
+def test_what_encoder_convert_separate_heads_state_dict(n_hidden):
+    """Verify if joint what encoder reproduces separate loc and scale encoders."""
+    kwargs = dict(
+        z_what_size=7, feature_channels=[4, 6], feature_maps=[5, 3], n_hidden=n_hidden
+    )
+    loc_encoder = WhatEncoder(z_what_scale_const=1.0, **kwargs)
+    scale_encoder = WhatEncoder(z_what_scale_const=1.0, **kwargs)
+    state_dict = {}
+    for name, encoder in [("loc", loc_encoder), ("scale", scale_encoder)]:
+        for key, value in encoder.state_dict().items():
+            state_dict[key.replace("encoder", f"{name}_encoder", 1)] = value
+    encoder = WhatEncoder(**kwargs)
+    encoder.load_state_dict(WhatEncoder.convert_separate_heads_state_dict(state_dict))
+    inputs = [torch.rand(2, 4, 5, 5), torch.rand(2, 6, 3, 3)]
+    with torch.no_grad():
+        locs, scales = encoder(inputs)
+        expected_locs, _ = loc_encoder(inputs)
+        scale_logits, _ = scale_encoder(inputs)
+    assert torch.allclose(locs, expected_locs, atol=1e-6)
+    assert torch.allclose(scales, torch.exp(scale_logits), atol=1e-6)
+
+
 @pytest.mark.parametrize("z_what_size", [2, 4, 5])
 @pytest.mark.parametrize("n_objects", [2, 4, 9])
 def test_what_decoder_dimensions(z_what_size, n_objects):
@@ -75,6 +115,59 @@ def test_what_decoder_dimensions(z_what_size, n_objects):
     assert outputs.shape == (n_objects, 3, 64, 64)
 
 
+def test_what_decoder_non_contiguous_inputs():
+    """Verify if what decoder accepts non-contiguous z_what."""
+    z_whats = torch.rand(4, 3).t()
+    decoder = WhatDecoder(z_what_size=4)
+    outputs = decoder(z_whats)
+    assert torch.allclose(outputs, decoder(z_whats.contiguous()))
+
+
+def test_what_decoder_upscale_conv_params():
+    """Verify if upscale block reproduces ConvTranspose2d with converted params."""
+    conv_transpose = nn.ConvTranspose2d(6, 4, kernel_size=2, stride=2)
+    conv, _, pixel_shuffle = WhatDecoder._build_upscale_block(6, 4)
+    weight, bias = WhatDecoder.upscale_conv_params(
+        conv_transpose.weight, conv_transpose.bias
+    )
+    conv.load_state_dict({"weight": weight, "bias": bias})
+    inputs = torch.rand(3, 6, 5, 5)
+    assert torch.allclose(
+        pixel_shuffle(conv(inputs)), conv_transpose(inputs), atol=1e-6
+    )
+
+
+def test_what_decoder_convert_conv_transpose_state_dict():
+    """Verify if decoder loads params of ConvTranspose2d-based decoder."""
+    channels = [1024, 512, 256, 128, 64, 32, 16]
+    layers = [nn.Conv2d(4, 1024, kernel_size=1), nn.ReLU()]
+    for in_channels, out_channels in zip(channels, channels[1:]):
+        layers.extend(
+            [
+                nn.ConvTranspose2d(in_channels, out_channels, kernel_size=2, stride=2),
+                nn.ReLU(),
+            ]
+        )
+    layers.extend([nn.Conv2d(16, 3, kernel_size=1), nn.Sigmoid()])
+    legacy_decoder = nn.Sequential(*layers)
+    decoder = WhatDecoder(z_what_size=4)
+    decoder.load_state_dict(
+        decoder.convert_conv_transpose_state_dict(
+            {
+                f"decoder.{key}": value
+                for key, value in legacy_decoder.state_dict().items()
+            }
+        )
+    )
+    state_dict = decoder.state_dict()
+    assert decoder.convert_conv_transpose_state_dict(state_dict) is state_dict
+    z_whats = torch.rand(2, 4)
+    with torch.no_grad():
+        assert torch.allclose(
+            decoder(z_whats), legacy_decoder(z_whats.view(2, 4, 1, 1)), atol=1e-5
+        )
+
+
 def test_what_decoder_dtype():
     """Verify what decoder output dtype."""
     z_whats = torch.rand(3, 4, 5)
@@ -83,3 +176,26 @@ def test_what_decoder_dtype():
     assert outputs.dtype == torch.float
     assert (outputs >= 0).all()
     assert (outputs <= 1).all()
+
+
+def test_what_decoder_export_for_inference():
+    """Verify if exported what decoder matches the original one."""
+    decoder = WhatDecoder(z_what_size=4)
+    exported = decoder.export_for_inference()
+    z_whats = torch.rand(5, 4)
+    assert decoder.training
+    assert torch.allclose(exported(z_whats), decoder(z_whats))
+
+
+def test_what_decoder_quantize():
+    """Verify if quantized what decoder approximates the original one."""
+    decoder = WhatDecoder(z_what_size=4).eval()
+    quantized = decoder.quantize(n_calibration_samples=32)
+    z_whats = torch.randn(5, 4)
+    with torch.no_grad():
+        outputs = decoder(z_whats)
+        quantized_outputs = quantized(z_whats)
+    assert quantized_outputs.shape == outputs.shape
+    assert quantized_outputs.dtype == torch.float
+    assert torch.allclose(quantized_outputs, outputs, atol=0.05)
+    assert all(not param.is_quantized for param in decoder.parameters())
@@ -83,7 +83,8 @@ def test_where_transformer_dimensions(decoded_size, image_size, hidden_size):
 )
 def test_get_inverse_theta(theta, expected):
     """Verify getting inverse transformation matrix."""
-    inverted = WhereTransformer.get_inverse_theta(theta)
+    transformer = WhereTransformer(image_size=1)
+    inverted = transformer.get_inverse_theta(theta)
     assert torch.equal(inverted, expected)
 
 
@@ -136,5 +137,6 @@ def test_scale_boxes(boxes, expected):
 )
 def test_expand_convert_boxes_to_theta(boxes, expected):
     """Verify expanding boxes to transformation matrix."""
-    transformation_mtx = WhereTransformer.convert_boxes_to_theta(boxes)
+    transformer = WhereTransformer(image_size=1)
+    transformation_mtx = transformer.convert_boxes_to_theta(boxes)
     assert torch.equal(transformation_mtx, expected)